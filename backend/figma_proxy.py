@@ -0,0 +1,219 @@
+from fastapi.responses import ORJSONResponse, Response
+from typing import Dict, Optional, Any
+import httpx
+import orjson
+from cachetools import TTLCache
+import asyncio
+import time
+import hashlib
+
+# Shared Figma API client, reused across requests so connections stay pooled
+FIGMA_API_BASE = "https://api.figma.com/v1"
+PAGE_ENDPOINT_PREFIXES = ("/files/",)
+# No base_url: request URLs are built as FIGMA_API_BASE + endpoint so an endpoint can never
+# resolve to another host
+figma_client = httpx.AsyncClient(
+    timeout=30.0,
+    # HTTP/2 multiplexes concurrent calls over one TLS connection; failed connects are retried once
+    transport=httpx.AsyncHTTPTransport(
+        http2=True,
+        retries=1,
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=100, keepalive_expiry=60),
+    ),
+)
+
+# In-flight Figma GET calls, keyed by endpoint and headers, so identical
+# concurrent requests share a single upstream call
+INFLIGHT_TTL = 60.0
+inflight_requests: Dict[tuple, tuple] = {}
+
+
+# Short-lived cache of successful Figma GET results, keyed by endpoint and request headers
+# Bounded by total body size rather than entry count, since a single Figma file can be many MB
+RESPONSE_CACHE_BYTES = 256 * 1024 * 1024
+response_cache = TTLCache(maxsize=RESPONSE_CACHE_BYTES, ttl=15, getsizeof=lambda result: len(result["content"]))
+response_cache_lock = asyncio.Lock()
+# Bumped whenever cached results are evicted, so a GET that was already in flight
+# when a mutating call landed doesn't put its stale result back in the cache
+cache_generation = 0
+
+# Response bodies larger than this are decoded off the event loop
+THREAD_PARSE_THRESHOLD = 256 * 1024
+
+
+def is_valid_json(content: bytes) -> bool:
+    """Whether a body decodes with orjson, the decoder every later reader of the body uses"""
+    try:
+        orjson.loads(content)
+    except orjson.JSONDecodeError:
+        return False
+    return True
+
+
+async def read_figma_response(response: httpx.Response) -> Dict[str, Any]:
+    """Capture a Figma response, leaving JSON bodies as raw bytes until they are needed"""
+    content = response.content
+    is_json = response.headers.get("content-type", "").startswith("application/json") and bool(content)
+    if is_json:
+        # Bodies are spliced into the proxy response verbatim and decoded later, so only
+        # bodies that decode are treated as JSON
+        if len(content) > THREAD_PARSE_THRESHOLD:
+            is_json = await asyncio.to_thread(is_valid_json, content)
+        else:
+            is_json = is_valid_json(content)
+    result = {
+        "status_code": response.status_code,
+        "headers": dict(response.headers),
+        "content": content,
+        "is_json": is_json
+    }
+    if not is_json:
+        result["data"] = response.text
+    return result
+
+
+async def figma_payload(result: Dict[str, Any]) -> Any:
+    """Decode a Figma response body, leaving the (possibly cached) result holding only raw bytes"""
+    if not result["is_json"]:
+        return result["data"]
+    content = result["content"]
+    if len(content) > THREAD_PARSE_THRESHOLD:
+        # Parse large files in a worker thread so the event loop keeps serving other requests
+        return await asyncio.to_thread(orjson.loads, content)
+    return orjson.loads(content)
+
+
+def figma_first_page(data: Any) -> Optional[Dict[str, Any]]:
+    """The first page (canvas) of a decoded Figma file, or None if the body isn't shaped like one"""
+    document = data.get("document") if isinstance(data, dict) else None
+    pages = document.get("children") if isinstance(document, dict) else None
+    if isinstance(pages, list) and pages:
+        return pages[0]
+    return None
+
+
+def figma_proxy_response(result: Dict[str, Any]) -> Response:
+    """Render a Figma result as the proxy response, splicing JSON bodies in without re-encoding them"""
+    if not result["is_json"]:
+        return ORJSONResponse({
+            "status_code": result["status_code"],
+            "data": result["data"],
+            "headers": result["headers"]
+        })
+
+    body = b"".join((
+        b'{"status_code":', str(result["status_code"]).encode(),
+        b',"data":', result["content"],
+        b',"headers":', orjson.dumps(result["headers"]),
+        b"}"
+    ))
+    return Response(content=body, media_type="application/json")
+
+
+async def request_figma_get(endpoint: str, headers: Dict[str, str]) -> Dict[str, Any]:
+    """GET a Figma endpoint and capture the response"""
+    response = await figma_client.get(FIGMA_API_BASE + endpoint, headers=headers)
+    return await read_figma_response(response)
+
+
+async def fetch_figma_get(endpoint: str, headers: Dict[str, str]) -> Dict[str, Any]:
+    """GET a Figma endpoint, coalescing identical concurrent requests"""
+    key = (endpoint, frozenset(headers.items()))
+    now = time.monotonic()
+    entry = inflight_requests.get(key)
+
+    if entry is None or now - entry[1] > INFLIGHT_TTL:
+        # Sweep calls that have been hanging for longer than the TTL
+        for stale_key, (_, started) in list(inflight_requests.items()):
+            if now - started > INFLIGHT_TTL:
+                del inflight_requests[stale_key]
+
+        task = asyncio.create_task(request_figma_get(endpoint, headers))
+        entry = (task, now)
+        inflight_requests[key] = entry
+
+        def release(_):
+            if inflight_requests.get(key) is entry:
+                del inflight_requests[key]
+
+        task.add_done_callback(release)
+
+    # Shield the shared call so one caller disconnecting doesn't cancel it for the rest
+    return await asyncio.shield(entry[0])
+
+
+async def fetch_figma_cached(endpoint: str, headers: Dict[str, str], bypass_cache: bool = False) -> Dict[str, Any]:
+    """GET a Figma endpoint, serving recent successful results from the response cache"""
+    # Credentials may arrive in any header (X-Figma-Token, Authorization) and in any case,
+    # so every header goes into the digest
+    header_items = sorted((name.lower(), value) for name, value in headers.items())
+    key = (endpoint, hashlib.blake2b(orjson.dumps(header_items)).digest())
+
+    if not bypass_cache:
+        async with response_cache_lock:
+            result = response_cache.get(key)
+        if result is not None:
+            return result
+
+    generation = cache_generation
+    result = await fetch_figma_get(endpoint, headers)
+    if result["status_code"] == 200 and generation == cache_generation:
+        async with response_cache_lock:
+            try:
+                response_cache[key] = result
+            except ValueError:
+                # Larger than the whole cache budget, serve it uncached
+                pass
+    return result
+
+
+def cache_scope(endpoint: str) -> str:
+    """The resource a Figma endpoint belongs to: /files/:file_key for anything in a file, else its top-level path"""
+    segments = endpoint.split("?", 1)[0].split("/")
+    return "/".join(segments[:3] if segments[1] == "files" else segments[:2])
+
+
+async def evict_figma_cache(endpoint: str) -> None:
+    """Drop cached and in-flight GETs in the same scope as an endpoint a mutating call went to"""
+    global cache_generation
+    cache_generation += 1
+    scope = cache_scope(endpoint)
+    async with response_cache_lock:
+        for key in [key for key in list(response_cache) if cache_scope(key[0]) == scope]:
+            response_cache.pop(key, None)
+    for key in [key for key in inflight_requests if cache_scope(key[0]) == scope]:
+        del inflight_requests[key]
+
+
+def is_figma_path(endpoint: str) -> bool:
+    """Whether an endpoint is a path on the Figma API, not an absolute or protocol-relative URL"""
+    if not endpoint.startswith("/") or endpoint.startswith("//"):
+        return False
+    try:
+        url = httpx.URL(endpoint)
+    except httpx.InvalidURL:
+        return False
+    return not url.scheme and not url.host
+
+
+def wants_fresh_response(cache_control: Optional[str]) -> bool:
+    """Whether the caller asked to bypass the response cache"""
+    return cache_control is not None and "no-cache" in cache_control.lower()
+
+
+async def send_figma_request(endpoint: str, call) -> Dict[str, Any]:
+    """Await a mutating Figma call and capture the response, evicting cached reads it may have changed"""
+    try:
+        return await read_figma_response(await call)
+    finally:
+        # Even a failed or timed out call may have reached Figma, so evict regardless
+        await evict_figma_cache(endpoint)
+
+
+# Upstream call for each method the proxy accepts, GET is served through the cache
+FIGMA_METHODS = {
+    "GET": lambda request, bypass_cache: fetch_figma_cached(request.endpoint, request.headers, bypass_cache),
+    "POST": lambda request, bypass_cache: send_figma_request(request.endpoint, figma_client.post(FIGMA_API_BASE + request.endpoint, headers=request.headers, json=request.body)),
+    "PUT": lambda request, bypass_cache: send_figma_request(request.endpoint, figma_client.put(FIGMA_API_BASE + request.endpoint, headers=request.headers, json=request.body)),
+    "DELETE": lambda request, bypass_cache: send_figma_request(request.endpoint, figma_client.delete(FIGMA_API_BASE + request.endpoint, headers=request.headers)),
+}
@@ -1,15 +1,30 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Header
 from dotenv import load_dotenv
+from fastapi.responses import ORJSONResponse, Response
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
+import asyncio
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Dict, Optional, Any
 import uuid
 from datetime import datetime, timezone
 import httpx
+import orjson
+import msgspec
+from figma_proxy import (
+    FIGMA_METHODS,
+    PAGE_ENDPOINT_PREFIXES,
+    figma_client,
+    figma_first_page,
+    fetch_figma_cached,
+    figma_payload,
+    figma_proxy_response,
+    is_figma_path,
+    wants_fresh_response,
+)
 
 
 ROOT_DIR = Path(__file__).parent
@@ -17,11 +32,24 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, tz_aware=True)
 db = client[os.environ['DB_NAME']]
 
+# Request history is queued and written in batches by a background task
+HISTORY_BATCH_SIZE = 500
+HISTORY_FLUSH_INTERVAL = 0.05
+HISTORY_MAX_PENDING_WRITES = 8
+# Queued and in-flight entries hold whole response bodies, so the backlog is bounded by
+# their size as well as their count in case MongoDB stalls
+HISTORY_MAX_QUEUED_BYTES = 256 * 1024 * 1024
+history_queue: asyncio.Queue = asyncio.Queue(maxsize=10_000)
+history_queued_bytes = 0
+history_writer_task: Optional[asyncio.Task] = None
+history_write_slots = asyncio.Semaphore(HISTORY_MAX_PENDING_WRITES)
+pending_history_writes: set = set()
+
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -79,124 +107,220 @@ class FigmaProxyRequest(BaseModel):
     body: Optional[Dict[str, Any]] = None
 
 
+# Read-only shapes for the list endpoints, converted and encoded with msgspec
+class SavedRequestOut(msgspec.Struct, kw_only=True):
+    id: str
+    user_identifier: str = "default_user"
+    name: str
+    method: str
+    endpoint: str
+    headers: Dict[str, str] = msgspec.field(default_factory=dict)
+    body: Optional[str] = None
+    category: str
+    is_favorite: bool = False
+    created_at: datetime
+
+
+class RequestHistoryOut(msgspec.Struct, kw_only=True):
+    id: str
+    user_identifier: str = "default_user"
+    method: str
+    endpoint: str
+    headers: Dict[str, str] = msgspec.field(default_factory=dict)
+    body: Optional[str] = None
+    status_code: int
+    timestamp: datetime
+
+
+def history_doc_size(doc: Dict[str, Any]) -> int:
+    """Size of the response body a queued history document holds"""
+    body = doc.get("response_content", doc.get("response_data"))
+    return len(body) if isinstance(body, (bytes, str)) else 0
+
+
+def record_history(doc: Dict[str, Any]) -> None:
+    """Queue a request history document for the background writer"""
+    global history_queued_bytes
+    size = history_doc_size(doc)
+    if history_queued_bytes + size > HISTORY_MAX_QUEUED_BYTES:
+        logger.warning("Request history queue is over its size budget, dropping entry for %s", doc.get("endpoint"))
+        return
+    try:
+        history_queue.put_nowait(doc)
+    except asyncio.QueueFull:
+        logger.warning("Request history queue is full, dropping entry for %s", doc.get("endpoint"))
+        return
+    history_queued_bytes += size
+
+
+def decode_history_bodies(batch: List[Dict[str, Any]]) -> None:
+    """Decode the raw JSON bodies queued with history documents into their response_data"""
+    for doc in batch:
+        content = doc.pop("response_content", None)
+        if content is None:
+            continue
+        try:
+            doc["response_data"] = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            # Keep the entry without its body rather than losing the rest of the batch
+            logger.warning("Failed to decode the response recorded for %s", doc.get("endpoint"))
+
+
+async def write_history_batch(batch: List[Dict[str, Any]]) -> None:
+    """Insert a batch of history documents, logging rather than raising on failure"""
+    global history_queued_bytes
+    size = sum(history_doc_size(doc) for doc in batch)
+    try:
+        await asyncio.to_thread(decode_history_bodies, batch)
+        await db.request_history.insert_many(batch, ordered=False)
+    except Exception:
+        logger.exception("Failed to write %d request history entries", len(batch))
+    finally:
+        history_queued_bytes -= size
+
+
+def history_write_done(task: asyncio.Task) -> None:
+    """Free the write slot held by a finished history insert"""
+    pending_history_writes.discard(task)
+    history_write_slots.release()
+
+
+async def history_writer():
+    """Drain the history queue into MongoDB until a None sentinel is received"""
+    loop = asyncio.get_running_loop()
+    running = True
+    while running:
+        batch = [await history_queue.get()]
+        deadline = loop.time() + HISTORY_FLUSH_INTERVAL
+
+        # Collect whatever else arrives within the flush interval, up to the batch size
+        while len(batch) < HISTORY_BATCH_SIZE and batch[-1] is not None:
+            if not history_queue.empty():
+                batch.append(history_queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(history_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        if batch[-1] is None:
+            batch.pop()
+            running = False
+        if batch:
+            # Hand the insert off so the next batch can be collected meanwhile; waiting
+            # for a free slot keeps a stalled MongoDB from piling up unbounded writes
+            await history_write_slots.acquire()
+            task = asyncio.create_task(write_history_batch(batch))
+            pending_history_writes.add(task)
+            task.add_done_callback(history_write_done)
+
+    if pending_history_writes:
+        await asyncio.gather(*pending_history_writes)
+
+
 # Figma API Routes
 @api_router.post("/figma/proxy")
-async def proxy_figma_request(request: FigmaProxyRequest):
+async def proxy_figma_request(request: FigmaProxyRequest, cache_control: Optional[str] = Header(default=None)):
     """Proxy requests to Figma API to handle CORS"""
     # Validate HTTP method first, before try block
-    if request.method.upper() not in ["GET", "POST", "PUT", "DELETE"]:
+    send = FIGMA_METHODS.get(request.method.upper())
+    if send is None:
         raise HTTPException(status_code=400, detail="Unsupported HTTP method")
+    # Only ever forward the caller's token to api.figma.com
+    if not is_figma_path(request.endpoint):
+        raise HTTPException(status_code=400, detail="Endpoint must be a Figma API path, e.g. /files/:file_key")
     
     try:
-        base_url = "https://api.figma.com/v1"
-        full_url = f"{base_url}{request.endpoint}"
-        
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            if request.method.upper() == "GET":
-                response = await client.get(full_url, headers=request.headers)
-            elif request.method.upper() == "POST":
-                response = await client.post(full_url, headers=request.headers, json=request.body)
-            elif request.method.upper() == "PUT":
-                response = await client.put(full_url, headers=request.headers, json=request.body)
-            elif request.method.upper() == "DELETE":
-                response = await client.delete(full_url, headers=request.headers)
-            
-            # Save to history
-            history_item = RequestHistory(
-                method=request.method,
-                endpoint=request.endpoint,
-                headers=request.headers,
-                body=str(request.body) if request.body else None,
-                response_data=response.json() if response.status_code == 200 else response.text,
-                status_code=response.status_code
-            )
-            
-            doc = history_item.model_dump()
-            doc['timestamp'] = doc['timestamp'].isoformat()
-            await db.request_history.insert_one(doc)
-            
-            return {
-                "status_code": response.status_code,
-                "data": response.json() if response.headers.get("content-type", "").startswith("application/json") else response.text,
-                "headers": dict(response.headers)
-            }
+        result = await send(request, wants_fresh_response(cache_control))
     except httpx.RequestError as e:
         raise HTTPException(status_code=500, detail=f"Request failed: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+
+    # Save to history, the fields were already validated on the incoming request
+    history_item = RequestHistory.model_construct(
+        method=request.method,
+        endpoint=request.endpoint,
+        headers=request.headers,
+        body=str(request.body) if request.body else None,
+        response_data=None if result["is_json"] else result["data"],
+        status_code=result["status_code"]
+    )
+
+    doc = history_item.model_dump()
+    if result["is_json"]:
+        # Decoded by the history writer, off the request path
+        doc["response_content"] = result["content"]
+    record_history(doc)
+
+    return figma_proxy_response(result)
 
 
 @api_router.post("/figma/page")
-async def get_figma_page(request: FigmaProxyRequest):
+async def get_figma_page(request: FigmaProxyRequest, cache_control: Optional[str] = Header(default=None)):
     """Get only the first page (canvas) from a Figma file"""
+    # Extract file_key from endpoint
+    if not request.endpoint.startswith(PAGE_ENDPOINT_PREFIXES):
+        raise HTTPException(status_code=400, detail="Endpoint must be in format /files/:file_key")
+    
     try:
-        # Extract file_key from endpoint
-        if not request.endpoint.startswith('/files/'):
-            raise HTTPException(status_code=400, detail="Endpoint must be in format /files/:file_key")
-        
-        base_url = "https://api.figma.com/v1"
-        full_url = f"{base_url}{request.endpoint}"
-        
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(full_url, headers=request.headers)
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                # Extract first page: root > document > children[0]
-                if 'document' in data and 'children' in data['document'] and len(data['document']['children']) > 0:
-                    first_page = data['document']['children'][0]
-                    
-                    # Save to history
-                    history_item = RequestHistory(
-                        method="PAGE",
-                        endpoint=request.endpoint,
-                        headers=request.headers,
-                        body=None,
-                        response_data=first_page,
-                        status_code=200
-                    )
-                    
-                    doc = history_item.model_dump()
-                    doc['timestamp'] = doc['timestamp'].isoformat()
-                    await db.request_history.insert_one(doc)
-                    
-                    return {
-                        "status_code": 200,
-                        "data": first_page,
-                        "headers": dict(response.headers)
-                    }
-                else:
-                    raise HTTPException(status_code=404, detail="No pages found in document")
-            else:
-                return {
-                    "status_code": response.status_code,
-                    "data": response.json() if response.headers.get("content-type", "").startswith("application/json") else response.text,
-                    "headers": dict(response.headers)
-                }
-                
+        result = await fetch_figma_cached(request.endpoint, request.headers, wants_fresh_response(cache_control))
     except httpx.RequestError as e:
         raise HTTPException(status_code=500, detail=f"Request failed: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+
+    if result["status_code"] == 200:
+        if not result["is_json"]:
+            raise HTTPException(status_code=502, detail="Figma returned a response that is not JSON")
+        data = await figma_payload(result)
+
+        # Extract first page: root > document > children[0]
+        first_page = figma_first_page(data)
+        if first_page is not None:
+
+            # Encoded once for both the response and the history entry, which queues
+            # raw bytes like the proxy does
+            page_content = orjson.dumps(first_page)
+
+            # Save to history
+            history_item = RequestHistory.model_construct(
+                method="PAGE",
+                endpoint=request.endpoint,
+                headers=request.headers,
+                body=None,
+                response_data=None,
+                status_code=200
+            )
+
+            doc = history_item.model_dump()
+            doc["response_content"] = page_content
+            record_history(doc)
+
+            return figma_proxy_response({
+                "status_code": 200,
+                "content": page_content,
+                "headers": result["headers"],
+                "is_json": True
+            })
+        else:
+            raise HTTPException(status_code=404, detail="No pages found in document")
+    else:
+        return figma_proxy_response(result)
 
 
 # Saved Requests Routes
-@api_router.get("/saved-requests", response_model=List[SavedRequest])
+@api_router.get("/saved-requests")
 async def get_saved_requests():
     requests = await db.saved_requests.find({}, {"_id": 0}).to_list(1000)
-    for req in requests:
-        if isinstance(req.get('created_at'), str):
-            req['created_at'] = datetime.fromisoformat(req['created_at'])
-    return requests
+    items = msgspec.convert(requests, List[SavedRequestOut])
+    return Response(content=msgspec.json.encode(items), media_type="application/json")
 
 
 @api_router.post("/saved-requests", response_model=SavedRequest)
 async def create_saved_request(request: SavedRequestCreate):
-    saved_req = SavedRequest(**request.model_dump())
-    doc = saved_req.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    await db.saved_requests.insert_one(doc)
+    # SavedRequestCreate has already validated these fields
+    saved_req = SavedRequest.model_construct(**request.model_dump())
+    await db.saved_requests.insert_one(saved_req.model_dump())
     return saved_req
 
 
@@ -226,13 +350,20 @@ async def delete_saved_request(request_id: str):
 
 
 # Request History Routes
-@api_router.get("/request-history", response_model=List[RequestHistory])
+@api_router.get("/request-history")
 async def get_request_history():
-    history = await db.request_history.find({}, {"_id": 0}).sort("timestamp", -1).to_list(100)
-    for item in history:
-        if isinstance(item.get('timestamp'), str):
-            item['timestamp'] = datetime.fromisoformat(item['timestamp'])
-    return history
+    # The list view doesn't show response bodies, fetch a single item for those
+    history = await db.request_history.find({}, {"_id": 0, "response_data": 0}).sort("timestamp", -1).to_list(100)
+    items = msgspec.convert(history, List[RequestHistoryOut])
+    return Response(content=msgspec.json.encode(items), media_type="application/json")
+
+
+@api_router.get("/request-history/{history_id}", response_model=RequestHistory)
+async def get_request_history_item(history_id: str):
+    item = await db.request_history.find_one({"id": history_id}, {"_id": 0})
+    if item is None:
+        raise HTTPException(status_code=404, detail="History item not found")
+    return item
 
 
 @api_router.delete("/request-history")
@@ -259,6 +390,28 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    try:
+        await db.request_history.create_index([("timestamp", -1)])
+        await db.request_history.create_index("id")
+        await db.saved_requests.create_index([("user_identifier", 1), ("category", 1)])
+        await db.saved_requests.create_index("id")
+    except Exception:
+        logger.exception("Failed to create MongoDB indexes")
+
+@app.on_event("startup")
+async def start_history_writer():
+    global history_writer_task
+    history_writer_task = asyncio.create_task(history_writer())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    # Flush queued history before closing the connection
+    await history_queue.put(None)
+    await history_writer_task
+    client.close()
+
+@app.on_event("shutdown")
+async def shutdown_figma_client():
+    await figma_client.aclose()
\ No newline at end of file
@@ -1,9 +1,21 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Header
+from fastapi.responses import ORJSONResponse
 from starlette.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Dict, Optional, Any
 import httpx
 import os
+from figma_proxy import (
+    FIGMA_METHODS,
+    PAGE_ENDPOINT_PREFIXES,
+    figma_client,
+    figma_first_page,
+    fetch_figma_cached,
+    figma_payload,
+    figma_proxy_response,
+    is_figma_path,
+    wants_fresh_response,
+)
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -11,7 +23,7 @@ ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # Create the main app
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -24,76 +36,54 @@ class FigmaProxyRequest(BaseModel):
 
 # Figma API Routes (without MongoDB dependency)
 @api_router.post("/figma/proxy")
-async def proxy_figma_request(request: FigmaProxyRequest):
+async def proxy_figma_request(request: FigmaProxyRequest, cache_control: Optional[str] = Header(default=None)):
     """Proxy requests to Figma API to handle CORS"""
     # Validate HTTP method first
-    if request.method.upper() not in ["GET", "POST", "PUT", "DELETE"]:
+    send = FIGMA_METHODS.get(request.method.upper())
+    if send is None:
         raise HTTPException(status_code=400, detail="Unsupported HTTP method")
+    # Only ever forward the caller's token to api.figma.com
+    if not is_figma_path(request.endpoint):
+        raise HTTPException(status_code=400, detail="Endpoint must be a Figma API path, e.g. /files/:file_key")
     
     try:
-        base_url = "https://api.figma.com/v1"
-        full_url = f"{base_url}{request.endpoint}"
-        
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            if request.method.upper() == "GET":
-                response = await client.get(full_url, headers=request.headers)
-            elif request.method.upper() == "POST":
-                response = await client.post(full_url, headers=request.headers, json=request.body)
-            elif request.method.upper() == "PUT":
-                response = await client.put(full_url, headers=request.headers, json=request.body)
-            elif request.method.upper() == "DELETE":
-                response = await client.delete(full_url, headers=request.headers)
-            
-            # Return response without saving to database
-            return {
-                "status_code": response.status_code,
-                "data": response.json() if response.headers.get("content-type", "").startswith("application/json") else response.text,
-                "headers": dict(response.headers)
-            }
+        result = await send(request, wants_fresh_response(cache_control))
     except httpx.RequestError as e:
         raise HTTPException(status_code=500, detail=f"Request failed: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+
+    # Return response without saving to database
+    return figma_proxy_response(result)
 
 @api_router.post("/figma/page")
-async def get_figma_page(request: FigmaProxyRequest):
+async def get_figma_page(request: FigmaProxyRequest, cache_control: Optional[str] = Header(default=None)):
     """Get only the first page (canvas) from a Figma file"""
+    # Extract file_key from endpoint
+    if not request.endpoint.startswith(PAGE_ENDPOINT_PREFIXES):
+        raise HTTPException(status_code=400, detail="Endpoint must be in format /files/:file_key")
+    
     try:
-        # Extract file_key from endpoint
-        if not request.endpoint.startswith('/files/'):
-            raise HTTPException(status_code=400, detail="Endpoint must be in format /files/:file_key")
-        
-        base_url = "https://api.figma.com/v1"
-        full_url = f"{base_url}{request.endpoint}"
-        
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(full_url, headers=request.headers)
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                # Extract first page: root > document > children[0]
-                if 'document' in data and 'children' in data['document'] and len(data['document']['children']) > 0:
-                    first_page = data['document']['children'][0]
-                    
-                    return {
-                        "status_code": 200,
-                        "data": first_page,
-                        "headers": dict(response.headers)
-                    }
-                else:
-                    raise HTTPException(status_code=404, detail="No pages found in document")
-            else:
-                return {
-                    "status_code": response.status_code,
-                    "data": response.json() if response.headers.get("content-type", "").startswith("application/json") else response.text,
-                    "headers": dict(response.headers)
-                }
-                
+        result = await fetch_figma_cached(request.endpoint, request.headers, wants_fresh_response(cache_control))
     except httpx.RequestError as e:
         raise HTTPException(status_code=500, detail=f"Request failed: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+
+    if result["status_code"] == 200:
+        if not result["is_json"]:
+            raise HTTPException(status_code=502, detail="Figma returned a response that is not JSON")
+        data = await figma_payload(result)
+
+        # Extract first page: root > document > children[0]
+        first_page = figma_first_page(data)
+        if first_page is not None:
+
+            return {
+                "status_code": 200,
+                "data": first_page,
+                "headers": result["headers"]
+            }
+        else:
+            raise HTTPException(status_code=404, detail="No pages found in document")
+    else:
+        return figma_proxy_response(result)
 
 # Mock endpoints for saved requests and history (return empty data)
 @api_router.get("/saved-requests")
@@ -136,6 +126,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("shutdown")
+async def shutdown_figma_client():
+    await figma_client.aclose()
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    # uvicorn's default "auto" loop and http settings pick uvloop and httptools when
+    # they are installed (uvloop is skipped on Windows, which falls back to asyncio)
+    uvicorn.run("server_minimal:app", host="0.0.0.0", port=8000, workers=os.cpu_count())
\ No newline at end of file
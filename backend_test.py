@@ -1,8 +1,14 @@
-import requests
+import asyncio
+import httpx
 import sys
 import json
+from contextvars import ContextVar
 from datetime import datetime
 
+# Output of the suite running in the current task. Suites run concurrently,
+# so each one collects its lines and prints them as a single block
+suite_output: ContextVar[list] = ContextVar("suite_output")
+
 class FigmaAPITester:
     def __init__(self, base_url=""):
         self.base_url = base_url
@@ -10,62 +16,79 @@ class FigmaAPITester:
         self.tests_run = 0
         self.tests_passed = 0
         self.saved_request_id = None
+        self.client = None
+
+    def log(self, *lines):
+        """Add lines to the current suite's output"""
+        suite_output.get().extend(lines)
+
+    def check(self, description, passed):
+        """Record a check on a response's content, beyond its status code"""
+        self.tests_run += 1
+        if passed:
+            self.tests_passed += 1
+            self.log(f"✅ Passed - {description}")
+        else:
+            self.log(f"❌ Failed - {description}")
+
+    async def run_suite(self, title, suite):
+        """Run a test suite and print its output once it has finished"""
+        lines = ["\n" + "="*50, f"TESTING {title}", "="*50]
+        suite_output.set(lines)
+        try:
+            await suite()
+        finally:
+            print("\n".join(lines))
 
-    def run_test(self, name, method, endpoint, expected_status, data=None, headers=None):
+    async def run_test(self, name, method, endpoint, expected_status, data=None, headers=None):
         """Run a single API test"""
         url = f"{self.api_url}/{endpoint}"
         request_headers = {'Content-Type': 'application/json'}
         if headers:
             request_headers.update(headers)
 
-        self.tests_run += 1
-        print(f"\n🔍 Testing {name}...")
-        print(f"   URL: {url}")
-        print(f"   Method: {method}")
+        lines = [f"\n🔍 Testing {name}...", f"   URL: {url}", f"   Method: {method}"]
         if data:
-            print(f"   Data: {json.dumps(data, indent=2)}")
-        
+            lines.append(f"   Data: {json.dumps(data, indent=2)}")
+
+        self.tests_run += 1
         try:
-            if method == 'GET':
-                response = requests.get(url, headers=request_headers)
-            elif method == 'POST':
-                response = requests.post(url, json=data, headers=request_headers)
-            elif method == 'PUT':
-                response = requests.put(url, json=data, headers=request_headers)
-            elif method == 'DELETE':
-                response = requests.delete(url, headers=request_headers)
+            response = await self.client.request(
+                method,
+                endpoint,
+                json=data if method in ('POST', 'PUT') else None,
+                headers=request_headers
+            )
 
             success = response.status_code == expected_status
             if success:
                 self.tests_passed += 1
-                print(f"✅ Passed - Status: {response.status_code}")
+                lines.append(f"✅ Passed - Status: {response.status_code}")
                 try:
                     response_data = response.json()
-                    print(f"   Response: {json.dumps(response_data, indent=2)[:200]}...")
+                    lines.append(f"   Response: {json.dumps(response_data, indent=2)[:200]}...")
                     return True, response_data
                 except:
                     return True, response.text
             else:
-                print(f"❌ Failed - Expected {expected_status}, got {response.status_code}")
+                lines.append(f"❌ Failed - Expected {expected_status}, got {response.status_code}")
                 try:
                     error_data = response.json()
-                    print(f"   Error: {json.dumps(error_data, indent=2)}")
+                    lines.append(f"   Error: {json.dumps(error_data, indent=2)}")
                 except:
-                    print(f"   Error: {response.text}")
+                    lines.append(f"   Error: {response.text}")
                 return False, {}
 
         except Exception as e:
-            print(f"❌ Failed - Error: {str(e)}")
+            lines.append(f"❌ Failed - Error: {str(e)}")
             return False, {}
+        finally:
+            self.log(*lines)
 
-    def test_saved_requests_crud(self):
+    async def test_saved_requests_crud(self):
         """Test CRUD operations for saved requests"""
-        print("\n" + "="*50)
-        print("TESTING SAVED REQUESTS CRUD")
-        print("="*50)
-        
         # Test GET saved requests (should be empty initially)
-        success, data = self.run_test(
+        success, data = await self.run_test(
             "Get Saved Requests (Empty)",
             "GET",
             "saved-requests",
@@ -83,7 +106,7 @@ class FigmaAPITester:
             "is_favorite": False
         }
         
-        success, data = self.run_test(
+        success, data = await self.run_test(
             "Create Saved Request",
             "POST",
             "saved-requests",
@@ -93,10 +116,10 @@ class FigmaAPITester:
         
         if success and data.get('id'):
             self.saved_request_id = data['id']
-            print(f"   Created request with ID: {self.saved_request_id}")
+            self.log(f"   Created request with ID: {self.saved_request_id}")
         
         # Test GET saved requests (should have one now)
-        success, data = self.run_test(
+        success, data = await self.run_test(
             "Get Saved Requests (With Data)",
             "GET",
             "saved-requests",
@@ -110,7 +133,7 @@ class FigmaAPITester:
                 "is_favorite": True
             }
             
-            success, data = self.run_test(
+            success, data = await self.run_test(
                 "Update Saved Request",
                 "PUT",
                 f"saved-requests/{self.saved_request_id}",
@@ -120,41 +143,82 @@ class FigmaAPITester:
         
         # Test DELETE saved request
         if self.saved_request_id:
-            success, data = self.run_test(
+            success, data = await self.run_test(
                 "Delete Saved Request",
                 "DELETE",
                 f"saved-requests/{self.saved_request_id}",
                 200
             )
 
-    def test_request_history(self):
+    async def test_request_history(self):
         """Test request history endpoints"""
-        print("\n" + "="*50)
-        print("TESTING REQUEST HISTORY")
-        print("="*50)
-        
-        # Test GET request history (should be empty initially)
-        success, data = self.run_test(
-            "Get Request History (Empty)",
+        # Test GET request history (the proxy suite may be writing to it concurrently)
+        success, data = await self.run_test(
+            "Get Request History",
             "GET",
             "request-history",
             200
         )
         
+        # Make a request of our own so there is a history item to fetch
+        history_request = {
+            "method": "GET",
+            "endpoint": "/me?history_check=1",
+            "headers": {"X-Figma-Token": "invalid-token-for-testing"},
+            "body": None
+        }
+        
+        success, data = await self.run_test(
+            "Figma Proxy (For History Item)",
+            "POST",
+            "figma/proxy",
+            200,
+            data=history_request
+        )
+        
+        # History is written in batches shortly after the response, so wait for it to land
+        history_item = None
+        for _ in range(20):
+            response = await self.client.get("request-history")
+            history_item = next((item for item in response.json() if item["endpoint"] == history_request["endpoint"]), None)
+            if history_item:
+                break
+            await asyncio.sleep(0.1)
+        
+        self.check("Proxied request appears in request history", history_item is not None)
+        
+        # Test GET a single history item, which carries the response body the list leaves out
+        if history_item:
+            self.check("History list omits response_data", 'response_data' not in history_item)
+            
+            success, data = await self.run_test(
+                "Get Request History Item",
+                "GET",
+                f"request-history/{history_item['id']}",
+                200
+            )
+            
+            if success:
+                self.check("History item includes response_data", 'response_data' in data)
+        
+        # Test GET a history item that doesn't exist
+        success, data = await self.run_test(
+            "Get Non-existent Request History Item",
+            "GET",
+            "request-history/invalid-id",
+            404
+        )
+        
         # Test DELETE clear history
-        success, data = self.run_test(
+        success, data = await self.run_test(
             "Clear Request History",
             "DELETE",
             "request-history",
             200
         )
 
-    def test_figma_proxy(self):
+    async def test_figma_proxy(self):
         """Test Figma API proxy endpoint"""
-        print("\n" + "="*50)
-        print("TESTING FIGMA PROXY")
-        print("="*50)
-        
         # Test proxy with invalid token (should fail but endpoint should work)
         proxy_request = {
             "method": "GET",
@@ -166,7 +230,7 @@ class FigmaAPITester:
         }
         
         # This should return 200 from our proxy but with error from Figma API
-        success, data = self.run_test(
+        success, data = await self.run_test(
             "Figma Proxy (Invalid Token)",
             "POST",
             "figma/proxy",
@@ -177,18 +241,14 @@ class FigmaAPITester:
         # The response should contain status_code and data fields
         if success:
             if 'status_code' in data and 'data' in data:
-                print("✅ Proxy response structure is correct")
+                self.log("✅ Proxy response structure is correct")
             else:
-                print("❌ Proxy response structure is incorrect")
+                self.log("❌ Proxy response structure is incorrect")
 
-    def test_error_cases(self):
+    async def test_error_cases(self):
         """Test error handling"""
-        print("\n" + "="*50)
-        print("TESTING ERROR CASES")
-        print("="*50)
-        
         # Test invalid saved request ID
-        success, data = self.run_test(
+        success, data = await self.run_test(
             "Get Non-existent Saved Request",
             "DELETE",
             "saved-requests/invalid-id",
@@ -203,7 +263,7 @@ class FigmaAPITester:
             "body": None
         }
         
-        success, data = self.run_test(
+        success, data = await self.run_test(
             "Figma Proxy (Invalid Method)",
             "POST",
             "figma/proxy",
@@ -211,17 +271,38 @@ class FigmaAPITester:
             data=invalid_proxy
         )
 
-def main():
+        # Test absolute URL endpoint for proxy (must not leave the Figma API)
+        absolute_proxy = {
+            "method": "GET",
+            "endpoint": "https://example.com/steal",
+            "headers": {"X-Figma-Token": "test"},
+            "body": None
+        }
+        
+        success, data = await self.run_test(
+            "Figma Proxy (Absolute URL Endpoint)",
+            "POST",
+            "figma/proxy",
+            400,
+            data=absolute_proxy
+        )
+
+async def main():
     print("🚀 Starting Figma API Playground Backend Tests")
     print("=" * 60)
     
     tester = FigmaAPITester()
     
-    # Run all test suites
-    tester.test_saved_requests_crud()
-    tester.test_request_history()
-    tester.test_figma_proxy()
-    tester.test_error_cases()
+    # Run all test suites concurrently over one pooled client; the CRUD
+    # chain still runs its steps in order inside its own suite
+    async with httpx.AsyncClient(base_url=tester.api_url, timeout=30.0, limits=httpx.Limits(max_connections=50)) as client:
+        tester.client = client
+        await asyncio.gather(
+            tester.run_suite("SAVED REQUESTS CRUD", tester.test_saved_requests_crud),
+            tester.run_suite("REQUEST HISTORY", tester.test_request_history),
+            tester.run_suite("FIGMA PROXY", tester.test_figma_proxy),
+            tester.run_suite("ERROR CASES", tester.test_error_cases)
+        )
     
     # Print final results
     print("\n" + "="*60)
@@ -240,4 +321,4 @@ def main():
         return 1
 
 if __name__ == "__main__":
-    sys.exit(main())
\ No newline at end of file
+    sys.exit(asyncio.run(main()))
\ No newline at end of file
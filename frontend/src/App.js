@@ -10,6 +10,7 @@ import { Textarea } from '@/components/ui/textarea';
 import { Card } from '@/components/ui/card';
 import { ScrollArea } from '@/components/ui/scroll-area';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select';
+import { Switch } from '@/components/ui/switch';
 import { toast } from 'sonner';
 import { Code, Play, Save, Star, Clock, Trash2, Copy, BookOpen, AlertCircle } from 'lucide-react';
 import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogDescription } from '@/components/ui/dialog';
@@ -55,6 +56,7 @@ function App() {
   const [body, setBody] = useState('');
   const [response, setResponse] = useState(null);
   const [loading, setLoading] = useState(false);
+  const [bypassCache, setBypassCache] = useState(false);
   const [savedRequests, setSavedRequests] = useState([]);
   const [history, setHistory] = useState([]);
   const [activeTab, setActiveTab] = useState('builder');
@@ -127,11 +129,19 @@ function App() {
         endpoint,
         headers: requestHeaders,
         body: body ? JSON.parse(body) : null
+      }, {
+        // The backend serves GETs from a short-lived cache unless asked not to
+        headers: bypassCache ? { 'Cache-Control': 'no-cache' } : {}
       });
 
       setResponse(res.data);
       toast.success('Request executed successfully');
-      loadHistory();
+      // History is written in batches shortly after the response, so refetching now would
+      // usually miss this request; add it locally instead (the backend only records pages it found)
+      if (method !== 'PAGE' || res.data.status_code === 200) {
+        const entry = { method, endpoint, status_code: res.data.status_code, timestamp: new Date().toISOString() };
+        setHistory(prev => [entry, ...prev].slice(0, 100));
+      }
     } catch (error) {
       setResponse({
         error: true,
@@ -338,6 +348,15 @@ function App() {
                     />
                   </div>
                   <div className="action-buttons">
+                    <div className="bypass-cache">
+                      <Switch
+                        id="bypass-cache"
+                        checked={bypassCache}
+                        onCheckedChange={setBypassCache}
+                        data-testid="bypass-cache-switch"
+                      />
+                      <Label htmlFor="bypass-cache">Bypass cache</Label>
+                    </div>
                     <Button onClick={saveRequest} variant="outline" data-testid="save-request-button">
                       <Save className="icon" />
                       Save